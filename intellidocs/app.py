@@ -1,33 +1,87 @@
 from flask import Flask, request, jsonify
-import io
+from flask.json.provider import JSONProvider
+from cachetools import LRUCache, TTLCache
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import hashlib
 import logging
+import orjson
 import os
-from utils.extractor import extract_text_from_pdf, extract_text_from_docx
-from utils.chunker import chunk_text
-from utils.embedder import generate_embeddings, embed_query
-from utils.faiss_index import create_faiss_index, retrieve_top_k_chunks
+import threading
+from utils.processor import process_file
+from utils.embedder import get_model, embed_query, embed_query_and_chunks
+from utils.faiss_index import as_chunk_array, create_faiss_index, retrieve_top_k_chunks
 from utils.llm import call_gemini
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
+class OrJSONProvider(JSONProvider):
+    """Flask JSON provider backed by orjson (also serializes NumPy scalars and arrays).
+    Keys are sorted, matching Flask's default provider"""
+    option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_SORT_KEYS
+    mimetype = "application/json"
 
-def extract_text_from_file(file_content, filename):
-    """Unified function to extract text from PDF, DOCX, or TXT"""
-    try:
-        if filename.lower().endswith(".pdf"):
-            return extract_text_from_pdf(io.BytesIO(file_content))
-        elif filename.lower().endswith(".docx"):
-            return extract_text_from_docx(io.BytesIO(file_content))
-        elif filename.lower().endswith(".txt"):
-            return file_content.decode('utf-8')
-        else:
-            raise ValueError(f"Unsupported file type: {filename}")
-    except Exception as e:
-        logger.error(f"Error extracting text from {filename}: {str(e)}")
-        raise
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=self.option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Same argument handling as jsonify, but emit orjson's bytes without re-encoding
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, option=self.option), mimetype=self.mimetype)
+
+app = Flask(__name__)
+app.json = OrJSONProvider(app)
+
+# Load the embedding model once at startup, so the first request does not pay
+# for it (with gunicorn --preload this runs in the master)
+get_model()
+
+# Worker processes for CPU-bound extraction + chunking of uploaded files
+_executor = None
+_executor_lock = threading.Lock()
+
+# Recently processed documents: (content hash, filename) -> chunks
+DOC_CACHE_SIZE = 256
+DOC_CACHE_TTL = 3600  # seconds
+_doc_cache = TTLCache(maxsize=DOC_CACHE_SIZE, ttl=DOC_CACHE_TTL)
+_doc_cache_lock = threading.Lock()
+_doc_cache_stats = {"hits": 0, "misses": 0}
+
+# Recently built indexes: tuple of document keys -> FAISS index over their chunks
+INDEX_CACHE_SIZE = 32
+_index_cache = LRUCache(maxsize=INDEX_CACHE_SIZE)
+_index_cache_lock = threading.Lock()
+
+def _get_executor():
+    """Create the extraction process pool on first use, in the serving process.
+    Never built at import: under gunicorn --preload, forked workers would
+    otherwise share the master's pool queues and pipes."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=min(os.cpu_count() or 1, 4))
+    return _executor
+
+def _reset_executor(broken):
+    """Discard a pool whose worker died (e.g. OOM-killed) so the next request builds a fresh one"""
+    global _executor
+    with _executor_lock:
+        if _executor is broken:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+def _hash_upload(file):
+    """BLAKE2b digest of an upload, streamed so the body is only read into memory on a cache miss"""
+    hasher = hashlib.blake2b(digest_size=16)
+    for block in iter(lambda: file.stream.read(1 << 20), b""):
+        hasher.update(block)
+    file.stream.seek(0)
+    return hasher.hexdigest()
 
 @app.route('/')
 def home():
@@ -52,69 +106,97 @@ def hackrx_webhook():
         logger.info(f"Processing query: {query}")
         logger.info(f"Processing {len(files)} uploaded documents")
 
-        all_chunks = []
-
-        for i, file in enumerate(files):
-            filename = file.filename
-            file_content = file.read()
-
+        # Reuse chunks for documents seen recently
+        doc_keys = [(_hash_upload(file), file.filename) for file in files]
+        file_chunks = [[] for _ in files]
+        misses = []
+
+        with _doc_cache_lock:
+            for i, key in enumerate(doc_keys):
+                cached = _doc_cache.get(key)
+                if cached is None:
+                    misses.append(i)
+                else:
+                    file_chunks[i] = cached
+            _doc_cache_stats["hits"] += len(files) - len(misses)
+            _doc_cache_stats["misses"] += len(misses)
+            total_lookups = _doc_cache_stats["hits"] + _doc_cache_stats["misses"]
+            logger.info(f"Document cache: {len(files) - len(misses)}/{len(files)} hits "
+                        f"(overall hit rate {_doc_cache_stats['hits'] / total_lookups:.1%})")
+
+        # Extract and chunk uncached files in parallel
+        executor = _get_executor()
+        futures = {}
+        for i in misses:
             try:
-                # Extract text from uploaded file bytes
-                text = extract_text_from_file(file_content, filename)
-                if not text or not text.strip():
-                    logger.warning(f"No text extracted from {filename}")
-                    continue
-                
-                logger.info(f"Extracted {len(text)} characters from {filename}")
-
-                # Chunk text
-                chunks = chunk_text(text, source_file=filename)
-                logger.info(f"Created {len(chunks)} chunks from {filename}")
-
-                all_chunks.extend(chunks)
-
+                futures[executor.submit(process_file, files[i].read(), files[i].filename)] = i
+            except BrokenProcessPool as e:
+                _reset_executor(executor)
+                logger.error(f"Failed to process {files[i].filename}: {str(e)}")
+                return jsonify({"error": f"Failed to process {files[i].filename}: {str(e)}"}), 500
+
+        for future in as_completed(futures):
+            i = futures[future]
+            filename = files[i].filename
+            try:
+                file_chunks[i] = future.result()
+                with _doc_cache_lock:
+                    _doc_cache[doc_keys[i]] = file_chunks[i]
             except Exception as e:
+                if isinstance(e, BrokenProcessPool):
+                    _reset_executor(executor)
                 logger.error(f"Failed to process {filename}: {str(e)}")
+                for pending in futures:
+                    pending.cancel()
                 return jsonify({"error": f"Failed to process {filename}: {str(e)}"}), 500
 
+        # Keep chunks in upload order regardless of completion order
+        all_chunks = [chunk for chunks in file_chunks for chunk in chunks]
+
         if not all_chunks:
             return jsonify({"error": "No text could be extracted from any documents"}), 400
 
         logger.info(f"Total chunks created: {len(all_chunks)}")
 
-        # Generate embeddings
-        try:
-            embeddings = generate_embeddings(all_chunks)
-            if embeddings.size == 0:
-                return jsonify({"error": "Failed to generate embeddings"}), 500
-            
-            logger.info(f"Generated embeddings shape: {embeddings.shape}")
-        except Exception as e:
-            logger.error(f"Error generating embeddings: {str(e)}")
-            return jsonify({"error": f"Failed to generate embeddings: {str(e)}"}), 500
-
-        # Build FAISS index
-        try:
-            index = create_faiss_index(embeddings)
-            if index is None:
-                return jsonify({"error": "Failed to build FAISS index"}), 500
-            
-            logger.info("FAISS index created successfully")
-        except Exception as e:
-            logger.error(f"Error creating FAISS index: {str(e)}")
-            return jsonify({"error": f"Failed to build FAISS index: {str(e)}"}), 500
+        # Reuse the index built for this exact set of documents; chunking is
+        # deterministic, so its ids still line up with all_chunks
+        index_key = tuple(doc_keys)
+        with _index_cache_lock:
+            index = _index_cache.get(index_key)
 
-        # Embed the query
-        try:
+        if index is not None:
+            logger.info("Reusing cached FAISS index")
             query_embedding = embed_query(query)
-            logger.info(f"Query embedding shape: {query_embedding.shape}")
-        except Exception as e:
-            logger.error(f"Error embedding query: {str(e)}")
-            return jsonify({"error": f"Failed to embed query: {str(e)}"}), 500
+        else:
+            # Embed the query and chunks together (repeat chunks come from the embedding cache)
+            try:
+                query_embedding, embeddings = embed_query_and_chunks(query, all_chunks)
+                if embeddings.size == 0:
+                    return jsonify({"error": "Failed to generate embeddings"}), 500
+
+                logger.info(f"Generated embeddings shape: {embeddings.shape}")
+                logger.info(f"Query embedding shape: {query_embedding.shape}")
+            except Exception as e:
+                logger.error(f"Error generating embeddings: {str(e)}")
+                return jsonify({"error": f"Failed to generate embeddings: {str(e)}"}), 500
+
+            # Build FAISS index
+            try:
+                index = create_faiss_index(embeddings)
+                if index is None:
+                    return jsonify({"error": "Failed to build FAISS index"}), 500
+                
+                logger.info("FAISS index created successfully")
+            except Exception as e:
+                logger.error(f"Error creating FAISS index: {str(e)}")
+                return jsonify({"error": f"Failed to build FAISS index: {str(e)}"}), 500
+
+            with _index_cache_lock:
+                _index_cache[index_key] = index
 
         # Retrieve top matching chunks
         try:
-            top_chunks = retrieve_top_k_chunks(query_embedding, index, all_chunks, k=5)
+            top_chunks = retrieve_top_k_chunks(query_embedding, index, as_chunk_array(all_chunks), k=5)
             logger.info(f"Retrieved {len(top_chunks)} relevant chunks")
             
             if not top_chunks:
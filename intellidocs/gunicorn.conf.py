@@ -0,0 +1,10 @@
+import os
+import torch
+
+# Load the app (and its SentenceTransformer model) once in the master and fork
+# it into workers, so workers share the model pages copy-on-write
+preload_app = True
+
+def post_fork(server, worker):
+    # Split the cores between workers so their intra-op threads do not oversubscribe them
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // server.cfg.workers))
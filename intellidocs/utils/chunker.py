@@ -1,9 +1,12 @@
 import re
 import logging
+import numpy as np
 from typing import List, Dict
 
 logger = logging.getLogger(__name__)
 
+_WORD_RE = re.compile(r"\S+")
+
 def chunk_text(text: str, source_file: str = "", chunk_size: int = 300, overlap: int = 50, min_chunk_size: int = 50) -> List[Dict]:
     """
     Split text into overlapping chunks with metadata
@@ -22,14 +25,13 @@ def chunk_text(text: str, source_file: str = "", chunk_size: int = 300, overlap:
         logger.warning("Empty text provided for chunking")
         return []
     
-    # Clean and normalize text
-    text = re.sub(r'\s+', ' ', text.strip())
-    words = text.split()
+    # Tokenize on whitespace in a single pass
+    words = _WORD_RE.findall(text)
     
     if len(words) <= chunk_size:
         if len(words) >= min_chunk_size:
             return [{
-                'text': text,
+                'text': " ".join(words),
                 'source': source_file,
                 'chunk_id': 0,
                 'start_word': 0,
@@ -39,30 +41,22 @@ def chunk_text(text: str, source_file: str = "", chunk_size: int = 300, overlap:
         else:
             return []
     
-    chunks = []
-    start = 0
-    chunk_id = 0
-    
-    while start < len(words):
-        end = min(start + chunk_size, len(words))
-        chunk_words = words[start:end]
-        
-        if len(chunk_words) >= min_chunk_size:
-            chunk_text = " ".join(chunk_words)
-            chunks.append({
-                'text': chunk_text,
-                'source': source_file,
-                'chunk_id': chunk_id,
-                'start_word': start,
-                'end_word': end,
-                'word_count': len(chunk_words)
-            })
-            chunk_id += 1
-        
-        if end >= len(words):
-            break
-        
-        start += chunk_size - overlap
+    # Compute every window up front; the last window is the first one reaching the end
+    step = chunk_size - overlap
+    num_windows = 1 + -(-(len(words) - chunk_size) // step)
+    starts = np.arange(num_windows) * step
+    ends = np.minimum(starts + chunk_size, len(words))
+    mask = (ends - starts) >= min_chunk_size
+    starts, ends = starts[mask].tolist(), ends[mask].tolist()
+
+    chunks = [{
+        'text': " ".join(words[start:end]),
+        'source': source_file,
+        'chunk_id': chunk_id,
+        'start_word': start,
+        'end_word': end,
+        'word_count': end - start
+    } for chunk_id, (start, end) in enumerate(zip(starts, ends))]
     
     logger.info(f"Created {len(chunks)} chunks from {len(words)} words (source: {source_file})")
     return chunks
\ No newline at end of file
@@ -1,44 +1,161 @@
 from sentence_transformers import SentenceTransformer
+import diskcache
+import torch
+import functools
+import hashlib
 import logging
 import numpy as np
+import os
 
 logger = logging.getLogger(__name__)
 
+MODEL_NAME = "all-MiniLM-L6-v2"
+ENCODE_BATCH_SIZE = 128
+EMBEDDING_CACHE_DIR = os.environ.get("EMBEDDING_CACHE_DIR", "./emb_cache")
+
 # Load model once
 _model = None
+_embedding_cache = None
 
 def get_model():
     """Lazily load the sentence transformer model"""
     global _model
     if _model is None:
         logger.info("Loading sentence transformer model...")
-        _model = SentenceTransformer("all-MiniLM-L6-v2")
-        logger.info("Model loaded successfully")
+        if torch.cuda.is_available():
+            device = "cuda"
+        elif torch.backends.mps.is_available():
+            device = "mps"
+        else:
+            device = "cpu"
+        _model = SentenceTransformer(MODEL_NAME, device=device)
+        if device == "cuda":
+            _model.half()  # FP16 weights/activations on GPU
+        logger.info(f"Model loaded successfully on {device}")
     return _model
 
+def get_embedding_cache():
+    """Lazily open the on-disk chunk embedding cache"""
+    global _embedding_cache
+    if _embedding_cache is None:
+        _embedding_cache = diskcache.Cache(EMBEDDING_CACHE_DIR)
+    return _embedding_cache
+
+def _embedding_cache_key(text: str) -> bytes:
+    """Content hash namespaced by model name, so switching models never reuses stale vectors"""
+    return MODEL_NAME.encode() + b":normalized:" + hashlib.sha256(text.encode()).digest()
+
+def embed_all(texts):
+    """Encode texts in a single batched forward pass, returning L2-normalized vectors"""
+    return get_model().encode(
+        texts,
+        batch_size=ENCODE_BATCH_SIZE,
+        convert_to_numpy=True,
+        normalize_embeddings=True,
+        show_progress_bar=False
+    )
+
+def _embed_chunk_texts(texts, query=None):
+    """
+    Embed chunk texts through the on-disk cache, encoding only the misses.
+
+    If a query is given and there are misses, it is encoded in the same
+    batch as the missed chunks.
+
+    Returns:
+        (query embedding or None, float16 chunk embeddings)
+    """
+    keys = [_embedding_cache_key(text) for text in texts]
+    vectors = [None] * len(texts)
+
+    # Look up previously embedded chunks
+    try:
+        cache = get_embedding_cache()
+        for i, key in enumerate(keys):
+            cached = cache.get(key)
+            if cached is not None:
+                vectors[i] = np.frombuffer(cached, dtype=np.float16)
+    except Exception as e:
+        cache = None
+        logger.warning(f"Embedding cache unavailable: {str(e)}")
+
+    # Encode only the cache misses
+    miss = [i for i, vec in enumerate(vectors) if vec is None]
+    logger.info(f"Embedding cache hits: {len(texts) - len(miss)}/{len(texts)}")
+    query_embedding = None
+    if miss:
+        batch = [texts[i] for i in miss]
+        if query is None:
+            encoded = embed_all(batch)
+        else:
+            encoded = embed_all([_normalize_query(query)] + batch)
+            query_embedding, encoded = encoded[:1].astype(np.float32, copy=False), encoded[1:]
+
+        for i, vec in zip(miss, encoded):
+            vectors[i] = vec
+
+        if cache is not None:
+            try:
+                with cache.transact():
+                    for i, vec in zip(miss, encoded):
+                        cache.set(keys[i], vec.astype(np.float16).tobytes())
+            except Exception as e:
+                logger.warning(f"Failed to write embedding cache: {str(e)}")
+
+    # Kept as float16 in Python; upcast to float32 only at the FAISS boundary
+    return query_embedding, np.vstack(vectors).astype(np.float16)
+
 def generate_embeddings(chunks):
     """Generate embeddings for list of chunk dictionaries (with 'text' key)"""
     if not chunks:
         return np.array([])
 
     try:
-        model = get_model()
         logger.info(f"Generating embeddings for {len(chunks)} chunks...")
-
-        texts = [chunk["text"] for chunk in chunks]
-        embeddings = model.encode(texts, show_progress_bar=False)
-
-        return np.array(embeddings)
+        _, embeddings = _embed_chunk_texts([chunk["text"] for chunk in chunks])
+        return embeddings
 
     except Exception as e:
         logger.error(f"Error generating embeddings: {str(e)}")
         return np.array([])
 
+def embed_query_and_chunks(query: str, chunks):
+    """
+    Embed a user query and chunk dictionaries with one model call where possible.
+
+    The query shares the encode batch of any chunks missing from the
+    embedding cache; otherwise it goes through the cached embed_query path.
+
+    Returns:
+        (query embedding, chunk embeddings), with chunk embeddings empty on failure
+    """
+    query_embedding, embeddings = None, np.array([])
+    if chunks:
+        try:
+            logger.info(f"Generating embeddings for query + {len(chunks)} chunks...")
+            query_embedding, embeddings = _embed_chunk_texts([chunk["text"] for chunk in chunks], query=query)
+        except Exception as e:
+            logger.error(f"Error generating embeddings: {str(e)}")
+
+    if query_embedding is None:
+        query_embedding = embed_query(query)
+    return query_embedding, embeddings
+
+def _normalize_query(query: str) -> str:
+    """Lowercase and collapse whitespace (MiniLM is uncased, so embeddings are unchanged)"""
+    return " ".join(query.lower().split())
+
+@functools.lru_cache(maxsize=4096)
+def _embed_query_cached(query: str) -> bytes:
+    """Encode a normalized query; cached as immutable float32 bytes (~1.5 KB) so repeat queries skip the model.
+    Hit/miss counts are available via _embed_query_cached.cache_info()"""
+    model = get_model()
+    return model.encode([query], normalize_embeddings=True)[0].astype(np.float32).tobytes()
+
 def embed_query(query: str) -> np.ndarray:
-    """Embed a single user query"""
+    """Embed a single user query as a normalized (1, dim) float32 array, ready for index.search"""
     try:
-        model = get_model()
-        return model.encode([query])[0]
+        return np.frombuffer(_embed_query_cached(_normalize_query(query)), dtype=np.float32).reshape(1, -1)
     except Exception as e:
         logger.error(f"Error embedding query: {str(e)}")
-        return np.zeros((384,))  # 384 is the dimension of MiniLM model
+        return np.zeros((1, 384), dtype=np.float32)  # 384 is the dimension of MiniLM model
@@ -1,24 +1,58 @@
+import fitz  # PyMuPDF
 import pdfplumber
-from docx import Document
+from lxml import etree
 import logging
 import io
+import os
+import zipfile
 
 logger = logging.getLogger(__name__)
 
+# WordprocessingML elements that carry or delimit text in word/document.xml
+_W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_W_T = _W_NS + "t"
+_W_P = _W_NS + "p"
+_W_TBL = _W_NS + "tbl"
+_DOCX_TEXT_TAGS = (_W_T, _W_P, _W_TBL, _W_NS + "tc", _W_NS + "tab", _W_NS + "br")
+# Text boxes are stored twice (DrawingML choice + VML fallback); only the choice is read
+_MC_FALLBACK = "{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback"
+
+def _extract_text_with_pymupdf(file_path_or_buffer):
+    """Extract the PDF text layer with PyMuPDF (much faster than pdfplumber's char clustering)"""
+    if isinstance(file_path_or_buffer, (str, os.PathLike)):
+        doc = fitz.open(file_path_or_buffer)
+    else:
+        data = file_path_or_buffer.read()
+        file_path_or_buffer.seek(0)  # Leave the buffer readable for the pdfplumber fallback
+        doc = fitz.open(stream=data, filetype="pdf")
+
+    with doc:
+        return "\n".join(page.get_text("text") for page in doc)
+
 def extract_text_from_pdf(file_path_or_buffer):
-    """Extract text from PDF using pdfplumber"""
+    """Extract text from PDF using PyMuPDF, falling back to pdfplumber"""
     try:
-        text = ""
+        try:
+            result = _extract_text_with_pymupdf(file_path_or_buffer).strip()
+            if result:
+                logger.info(f"Extracted {len(result)} characters from PDF")
+                return result
+            logger.info("PyMuPDF found no text layer, falling back to pdfplumber")
+        except Exception as e:
+            logger.warning(f"PyMuPDF extraction failed, falling back to pdfplumber: {str(e)}")
+
+        parts = []
         with pdfplumber.open(file_path_or_buffer) as pdf:
             for page_num, page in enumerate(pdf.pages):
                 try:
-                    page_text = page.extract_text()
+                    page_text = page.extract_text(x_tolerance=2, y_tolerance=2)
                     if page_text:
-                        text += page_text + "\n"
+                        parts.append(page_text)
                 except Exception as e:
                     logger.warning(f"Error extracting page {page_num}: {str(e)}")
                     continue
-        
+
+        text = "\n".join(parts)
         result = text.strip()
         logger.info(f"Extracted {len(result)} characters from PDF")
         return result
@@ -28,27 +62,38 @@ def extract_text_from_pdf(file_path_or_buffer):
         return ""
 
 def extract_text_from_docx(file_path_or_buffer):
-    """Extract text from DOCX using python-docx"""
+    """Extract paragraph and table text from DOCX in a single pass over word/document.xml"""
     try:
-        # Handle both file paths and BytesIO objects
-        if isinstance(file_path_or_buffer, io.BytesIO):
-            doc = Document(file_path_or_buffer)
-        else:
-            doc = Document(file_path_or_buffer)
-            
-        text = ""
-        for paragraph in doc.paragraphs:
-            if paragraph.text.strip():  # Only add non-empty paragraphs
-                text += paragraph.text + "\n"
-        
-        # Also extract text from tables
-        for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    if cell.text.strip():
-                        text += cell.text + " "
-                text += "\n"
-        
+        # ZipFile handles both file paths and BytesIO objects
+        with zipfile.ZipFile(file_path_or_buffer) as docx:
+            xml = docx.read("word/document.xml")
+
+        # Runs within a paragraph are concatenated; paragraphs, cells, tabs and breaks separate words
+        parts = []
+        # Uploaded XML is untrusted: never resolve entities or fetch DTDs (XXE)
+        events = etree.iterparse(
+            io.BytesIO(xml),
+            tag=_DOCX_TEXT_TAGS,
+            resolve_entities=False,
+            load_dtd=False,
+            no_network=True
+        )
+        for _, elem in events:
+            if next(elem.iterancestors(_MC_FALLBACK), None) is not None:
+                pass
+            elif elem.tag == _W_T:
+                parts.extend(elem.itertext())  # Also keeps text after any unresolved entity
+            elif elem.tag == _W_P:
+                parts.append("\n")
+            elif elem.tag != _W_TBL:
+                parts.append(" ")
+            elem.clear()
+            if elem.tag in (_W_P, _W_TBL):
+                # Drop finished siblings so the parsed tree stays small on large documents
+                while elem.getprevious() is not None:
+                    del elem.getparent()[0]
+
+        text = "".join(parts)
         result = text.strip()
         logger.info(f"Extracted {len(result)} characters from DOCX")
         return result
@@ -1,13 +1,113 @@
 import faiss
 import numpy as np
+import hashlib
 import logging
+import math
+import os
+import tempfile
 from typing import List, Dict
 
 logger = logging.getLogger(__name__)
 
+# Index tunables
+HNSW_MIN_VECTORS = 1000     # Below this, brute-force Flat search beats HNSW graph descent
+IVF_PQ_MIN_VECTORS = 10000  # Below this, training IVF-PQ costs more than it saves; use HNSW
+HNSW_M = 32                 # Graph neighbours per node
+HNSW_EF_CONSTRUCTION = 80   # Candidate list size while building the graph
+HNSW_EF_SEARCH = 64         # Candidate list size per query (recall vs. latency)
+FLAT_QUANTIZER = faiss.ScalarQuantizer.QT_fp16  # Storage for exhaustive indexes; QT_8bit halves it again
+PQ_M = 32                   # Sub-quantizers per vector (must divide dim; 384 / 32 -> 12 dims each)
+NPROBE = 16                 # Inverted lists visited per query
+MIN_POINTS_PER_LIST = 39    # FAISS k-means needs ~39 training points per IVF centroid
+INDEX_CACHE_DIR = os.environ.get("FAISS_INDEX_CACHE_DIR", "./faiss_cache")
+INDEX_CACHE_MAX_FILES = 16  # Trained indexes kept on disk; least recently used are evicted
+
+def _assert_normalized(embeddings: np.ndarray):
+    """Debug-only check that vectors are unit length (normalization happens at encode time).
+    Skipped unless DEBUG logging is on, since it costs a full pass over the embeddings"""
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    assert np.allclose(np.linalg.norm(embeddings, axis=1), 1.0, atol=1e-2), \
+        "Embeddings must be L2-normalized before indexing"
+
+def _new_flat_index(dim: int):
+    """Exhaustive inner-product index over scalar-quantized vectors (no training required)"""
+    return faiss.IndexScalarQuantizer(dim, FLAT_QUANTIZER, faiss.METRIC_INNER_PRODUCT)
+
+def _pq_subquantizers(dim: int) -> int:
+    """Largest divisor of dim that does not exceed PQ_M"""
+    for m in range(min(PQ_M, dim), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+def _index_cache_path(embeddings: np.ndarray) -> str:
+    """On-disk location of the trained index for this exact set of embeddings"""
+    digest = hashlib.sha256(embeddings.tobytes()).hexdigest()
+    return os.path.join(INDEX_CACHE_DIR, f"{digest}.index")
+
+def _evict_index_cache():
+    """Delete the least recently used trained indexes beyond INDEX_CACHE_MAX_FILES"""
+    try:
+        paths = [os.path.join(INDEX_CACHE_DIR, name) for name in os.listdir(INDEX_CACHE_DIR) if name.endswith(".index")]
+        paths.sort(key=os.path.getmtime, reverse=True)
+        for path in paths[INDEX_CACHE_MAX_FILES:]:
+            os.remove(path)
+    except Exception as e:
+        logger.warning(f"Failed to evict FAISS index cache: {str(e)}")
+
+def _build_ivf_pq_index(embeddings: np.ndarray):
+    """Train and populate an IVF-PQ index, reusing a persisted copy when available"""
+    n, dim = embeddings.shape
+    cache_path = _index_cache_path(embeddings)
+
+    if os.path.exists(cache_path):
+        try:
+            index = faiss.read_index(cache_path)
+            faiss.extract_index_ivf(index).nprobe = NPROBE
+            os.utime(cache_path)  # Mark as recently used for eviction
+            logger.info(f"Loaded trained FAISS index from {cache_path}")
+            return index
+        except Exception as e:
+            logger.warning(f"Failed to load cached FAISS index {cache_path}: {str(e)}")
+
+    # ~4*sqrt(N) lists, capped so every centroid gets enough training points
+    nlist = max(1, min(int(4 * math.sqrt(n)), n // MIN_POINTS_PER_LIST))
+    m = _pq_subquantizers(dim)
+    index = faiss.index_factory(dim, f"IVF{nlist},PQ{m}", faiss.METRIC_INNER_PRODUCT)
+    index.do_polysemous_training = False  # Only used by polysemous search; dominates training time
+    index.train(embeddings)
+    index.add(embeddings)
+    faiss.extract_index_ivf(index).nprobe = NPROBE
+
+    tmp_path = None
+    try:
+        os.makedirs(INDEX_CACHE_DIR, exist_ok=True)
+        # Unique temp name so concurrent builds of the same index never share a file
+        fd, tmp_path = tempfile.mkstemp(dir=INDEX_CACHE_DIR, suffix=".tmp")
+        os.close(fd)
+        faiss.write_index(index, tmp_path)
+        os.replace(tmp_path, cache_path)
+        tmp_path = None
+        _evict_index_cache()
+    except Exception as e:
+        logger.warning(f"Failed to persist FAISS index to {cache_path}: {str(e)}")
+    finally:
+        if tmp_path is not None:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    return index
+
 def create_faiss_index(embeddings: np.ndarray):
     """
     Create a FAISS index from normalized embeddings using cosine similarity.
+    Embeddings must already be L2-normalized (see generate_embeddings).
+
+    Large corpora get a trained IVF-PQ index (persisted under INDEX_CACHE_DIR),
+    mid-sized ones an HNSW graph, and small ones exact brute-force search.
 
     Args:
         embeddings: A 2D NumPy array of shape (n_samples, dim)
@@ -20,14 +120,26 @@ def create_faiss_index(embeddings: np.ndarray):
         return None
 
     try:
-        # Ensure float32 and normalize for cosine similarity
+        # Embeddings arrive L2-normalized (float16) from generate_embeddings; FAISS needs float32
         embeddings = embeddings.astype("float32")
-        faiss.normalize_L2(embeddings)
-
-        dim = embeddings.shape[1]
-        index = faiss.IndexFlatIP(dim)  # Inner product ≈ cosine similarity for normalized vectors
+        _assert_normalized(embeddings)
+
+        n, dim = embeddings.shape
+        if n >= IVF_PQ_MIN_VECTORS:
+            # Compressed IVF-PQ: sub-linear search over 8-bit codes instead of raw float32 vectors
+            index = _build_ivf_pq_index(embeddings)
+        elif n >= HNSW_MIN_VECTORS:
+            # HNSW graph: no training step, sub-linear search
+            index = faiss.IndexHNSWFlat(dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+            index.hnsw.efSearch = HNSW_EF_SEARCH
+            index.add(embeddings)
+        else:
+            index = _new_flat_index(dim)  # Inner product ≈ cosine similarity for normalized vectors
+            if not index.is_trained:
+                index.train(embeddings)  # Only needed for QT_8bit range estimation
+            index.add(embeddings)
 
-        index.add(embeddings)
         logger.info(f"FAISS index created with {index.ntotal} vectors (dim={dim})")
 
         return index
@@ -36,14 +148,20 @@ def create_faiss_index(embeddings: np.ndarray):
         logger.error(f"Error creating FAISS index: {str(e)}")
         return None
 
-def retrieve_top_k_chunks(query_embedding: np.ndarray, index, chunks: List[Dict], k: int = 5) -> List[Dict]:
+def as_chunk_array(chunks: List[Dict]) -> np.ndarray:
+    """Wrap chunk dicts in a 1D object array so retrieval can fancy-index them"""
+    chunks_arr = np.empty(len(chunks), dtype=object)
+    chunks_arr[:] = chunks
+    return chunks_arr
+
+def retrieve_top_k_chunks(query_embedding: np.ndarray, index, chunks, k: int = 5) -> List[Dict]:
     """
     Retrieve top-k similar chunks based on a query embedding.
 
     Args:
-        query_embedding: NumPy array of shape (dim,) for the user query
+        query_embedding: Normalized float32 array of shape (1, dim) from embed_query
         index: FAISS index
-        chunks: Original list of text chunks (with metadata)
+        chunks: Original text chunks (with metadata), ideally pre-built with as_chunk_array
         k: Number of top results to return
 
     Returns:
@@ -58,26 +176,20 @@ def retrieve_top_k_chunks(query_embedding: np.ndarray, index, chunks: List[Dict]
         return []
 
     try:
-        # Ensure query embedding is 2D and normalized
-        if query_embedding.ndim == 1:
-            query_vector = query_embedding.reshape(1, -1)
-        else:
-            query_vector = query_embedding
-            
-        query_vector = query_vector.astype("float32")
-        faiss.normalize_L2(query_vector)
-
         # Search for top k chunks
         num_search = min(k, len(chunks), index.ntotal)
-        scores, indices = index.search(query_vector, num_search)
-
-        top_chunks = []
-        for rank, (idx, score) in enumerate(zip(indices[0], scores[0])):
-            if idx >= 0 and idx < len(chunks):  # Valid index
-                chunk = chunks[idx].copy()
-                chunk['similarity_score'] = float(score)
-                chunk['rank'] = rank + 1
-                top_chunks.append(chunk)
+        scores, indices = index.search(query_embedding, num_search)
+        labels = indices[0]
+
+        if not isinstance(chunks, np.ndarray):
+            chunks = as_chunk_array(chunks)
+
+        valid = (labels >= 0) & (labels < len(chunks))  # FAISS pads missing results with -1
+        picks = chunks[labels[valid]]
+        top_chunks = [
+            {**chunk, 'similarity_score': float(score), 'rank': rank + 1}
+            for rank, (chunk, score) in enumerate(zip(picks, scores[0][valid]))
+        ]
 
         logger.info(f"Retrieved {len(top_chunks)} chunks with scores: {[c['similarity_score'] for c in top_chunks[:3]]}")
         return top_chunks
@@ -2,13 +2,17 @@ from dotenv import load_dotenv
 load_dotenv()
 
 import google.generativeai as genai
-import json
+import orjson
 import os
 import logging
+import re
 from typing import Dict, Any
 
 logger = logging.getLogger(__name__)
 
+# Outermost {...} span in the model output (prose or code fences may surround it)
+_JSON_RE = re.compile(r"\{.*\}", re.DOTALL)
+
 # Configure Gemini API
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
 if not GEMINI_API_KEY:
@@ -16,55 +20,38 @@ if not GEMINI_API_KEY:
 else:
     genai.configure(api_key=GEMINI_API_KEY)
 
-def call_gemini(query: str, chunks: list) -> Dict[str, Any]:
-    """
-    Call Gemini API with query and relevant document chunks
-    
-    Args:
-        query: User's question
-        chunks: List of relevant text chunks from documents
-        
-    Returns:
-        Structured JSON response
-    """
-    if not GEMINI_API_KEY:
-        return {
-            "error": "LLM not configured",
-            "decision": "error",
-            "confidence": 0.0
-        }
-
-    try:
-        model = genai.GenerativeModel("models/gemini-2.5-flash")
+# Maximum characters of each chunk sent to the LLM (~1k tokens), so oversized context never triggers retries
+MAX_CHUNK_CHARS = 4000
 
-        # Create context from chunks
-        context = "\n\n".join([f"Chunk {i+1}:\n{chunk}" for i, chunk in enumerate(chunks)])
-
-        # Enhanced insurance decision-making prompt
-        prompt = f"""
+# Static parts of the insurance decision-making prompt; only the context and query vary per request
+_PROMPT_PREFIX = """
 You are an AI assistant for an insurance company. Your job is to determine if a claim should be **accepted** or **rejected** based on insurance policy documents.
 
 DOCUMENT CONTEXT:
-{context}
+"""
+
+_PROMPT_MID = '''
 
 USER QUERY (claim scenario):
-"{query}"
+"'''
+
+_PROMPT_SUFFIX = '''"
 
 Please analyze the document context and return a structured response strictly in the following JSON format:
 
-{{
+{
   "decision": "<accepted/rejected/pending/unknown>",
   "justification": [
-    {{
+    {
       "clause": "<specific clause or section>",
       "text": "<exact supporting text from the document>",
       "relevance": "<why this text supports the decision>"
-    }}
+    }
   ],
   "confidence": <float between 0.0 and 1.0>,
   "summary": "<short human-readable summary of your reasoning>",
   "reasoning": "<step-by-step explanation of how the decision was made>"
-}}
+}
 
 RULES:
 - Only use the content from the DOCUMENT CONTEXT.
@@ -73,7 +60,34 @@ RULES:
 - If the document doesn't support a clear decision, use "pending" or "unknown".
 
 Return only valid JSON. Do not include any extra commentary.
-"""
+'''
+
+def call_gemini(query: str, chunks: list) -> Dict[str, Any]:
+    """
+    Call Gemini API with query and relevant document chunks
+    
+    Args:
+        query: User's question
+        chunks: List of relevant text chunks from documents
+        
+    Returns:
+        Structured JSON response
+    """
+    if not GEMINI_API_KEY:
+        return {
+            "error": "LLM not configured",
+            "decision": "error",
+            "confidence": 0.0
+        }
+
+    try:
+        model = genai.GenerativeModel("models/gemini-2.5-flash")
+
+        # Create context from chunks
+        context = "\n\n".join(f"Chunk {i+1}:\n{chunk[:MAX_CHUNK_CHARS]}" for i, chunk in enumerate(chunks))
+
+        # Enhanced insurance decision-making prompt
+        prompt = "".join((_PROMPT_PREFIX, context, _PROMPT_MID, query, _PROMPT_SUFFIX))
 
         logger.info("Sending request to LLM...")
         response = model.generate_content(prompt)
@@ -88,14 +102,12 @@ Return only valid JSON. Do not include any extra commentary.
         # Parse JSON response
         try:
             text = response.text.strip()
-            json_start = text.find("{")
-            json_end = text.rfind("}") + 1
+            match = _JSON_RE.search(text)
 
-            if json_start == -1 or json_end == 0:
+            if match is None:
                 return create_fallback_response(query, text)
 
-            json_text = text[json_start:json_end]
-            parsed_response = json.loads(json_text)
+            parsed_response = orjson.loads(match.group(0))
 
             # Validate required fields
             required_fields = ["decision", "confidence"]
@@ -113,7 +125,7 @@ Return only valid JSON. Do not include any extra commentary.
             logger.info(f"Successfully parsed LLM response with confidence: {parsed_response['confidence']}")
             return parsed_response
 
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             logger.warning(f"Failed to parse JSON response: {str(e)}")
             return create_fallback_response(query, response.text)
 
@@ -0,0 +1,39 @@
+import io
+import logging
+from utils.extractor import extract_text_from_pdf, extract_text_from_docx
+from utils.chunker import chunk_text
+
+# Kept free of model loading and other import side effects: this module is
+# imported by the extraction worker processes.
+
+logger = logging.getLogger(__name__)
+
+def extract_text_from_file(file_content, filename):
+    """Unified function to extract text from PDF, DOCX, or TXT"""
+    try:
+        if filename.lower().endswith(".pdf"):
+            return extract_text_from_pdf(io.BytesIO(file_content))
+        elif filename.lower().endswith(".docx"):
+            return extract_text_from_docx(io.BytesIO(file_content))
+        elif filename.lower().endswith(".txt"):
+            return file_content.decode('utf-8')
+        else:
+            raise ValueError(f"Unsupported file type: {filename}")
+    except Exception as e:
+        logger.error(f"Error extracting text from {filename}: {str(e)}")
+        raise
+
+def process_file(file_content, filename):
+    """Extract and chunk a single uploaded file (runs in a worker process)"""
+    # Extract text from uploaded file bytes
+    text = extract_text_from_file(file_content, filename)
+    if not text or not text.strip():
+        logger.warning(f"No text extracted from {filename}")
+        return []
+
+    logger.info(f"Extracted {len(text)} characters from {filename}")
+
+    # Chunk text
+    chunks = chunk_text(text, source_file=filename)
+    logger.info(f"Created {len(chunks)} chunks from {filename}")
+    return chunks